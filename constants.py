@@ -55,6 +55,7 @@ CROSSED = Ansi.CROSSED
 RESET = Ansi.RESET
 
 class BaseItem:
+    __slots__ = ("count", "maxcount") # items are created for every stack split, skip the instance dict
     count: int
     maxcount: int
     def __init__(self, count: int = 1):
@@ -65,6 +66,7 @@ class BaseItem:
 
 
 class Item(BaseItem): # unique item
+    __slots__ = ("name", "description")
     name: str
     description: str
     def __init__(self, name: str, description: str):
@@ -80,6 +82,7 @@ class Item(BaseItem): # unique item
 
 
 class ItemStack(Item): # stackable item
+    __slots__ = ()
     def __init__(self, name: str, description: str, maxcount: int = 99):
         super().__init__(name, description)
         self.maxcount = maxcount
@@ -87,15 +90,20 @@ class ItemStack(Item): # stackable item
         return f"ItemStack({self.name}, {self.count}/{self.maxcount})"
 
     def add(self, count: int):
-        if self.count + count > self.maxcount:
-            return count - (self.maxcount - self.count) # return excess
+        room = self.maxcount - self.count
+        if count > room: # fill the stack to its cap and hand back the rest
+            self.count = self.maxcount
+            return count - room # return excess
         self.count += count
         return 0
 
     def remove(self, count: int):
-        if self.count - count < 0:
-            return count - self.count # return excess
+        if count > self.count: # empty the stack and report what is still owed
+            count -= self.count
+            self.count = 0
+            return count # return excess
         self.count -= count
+        return 0
 
 
 class Inventory:
@@ -257,6 +265,7 @@ class Player:
 
 
 class Monster:
+    __slots__ = ("name", "weapon", "strength", "hp", "gold", "xp", "message") # cloned per encounter
     def __init__(self, name: str, weapon: str, strength: int, hp: int, gold: int, xp: int, message: str):
         self.name = name
         self.weapon = weapon
@@ -270,30 +279,35 @@ class Monster:
         return self.__class__(self.name, self.weapon, self.strength, self.hp, self.gold, self.xp, self.message)
 
 
+DICE_RE = re.compile(r"(?:(\d*)d)?(\d+)")
+
 class Dice:
+    __slots__ = ("num", "sides", "total", "faces")
     num: int
     sides: int
     def __init__(self, notation="6"):
         self.total = 0
 
-        pattern = re.fullmatch(r"(?:(\d*)d)?(\d+)", notation.lower())
+        pattern = DICE_RE.fullmatch(notation.lower())
         if not pattern:
             raise ValueError(f"Invalid dice format: {notation}")
 
         self.num = int(pattern.group(1)) if pattern.group(1) else 1
         self.sides = int(pattern.group(2))
+        self.faces = range(1, self.sides + 1)
 
     def roll(self):
-        rolls = [random.randint(1, self.sides) for _ in range(self.num)]
-        return sum(rolls)
+        # draw every die in one call rather than a randint round trip per die
+        return sum(random.choices(self.faces, k=self.num))
 
     def __str__(self):
         return f"Dice({self.num}d{self.sides})"
 
 class PercentileDice(Dice):
+    __slots__ = ()
     def __init__(self):
         super().__init__("2d10")
 
     def roll(self):
-        rolls = [random.randint(1, self.sides) for _ in range(self.num)]
+        rolls = random.choices(self.faces, k=self.num)
         return rolls[0] + (rolls[1] - 1) * 10
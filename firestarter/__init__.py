@@ -36,17 +36,17 @@ Typical workflow:
 
 This model favors flexibility, determinism, and long-term maintainability.
 """
-from typing import List, Union, Tuple, Type, Any, Optional, Dict, get_origin, get_args, get_type_hints
+from typing import List, Union, Tuple, Type, Any, Optional, Dict, Iterator, Callable, get_origin, get_args, get_type_hints
 from types import UnionType
-from abc import ABC, abstractmethod
 from .grammar import Grammar, GrammarError, Match, RulePrimitive, AST
 import inspect
+import sys
 
 from constants import RED, RESET
 
 # Firestarter compiler
 
-class Symbol(ABC):
+class Symbol:
     """
     Abstract base class for all symbolic operations in the Firestarter compiler.
 
@@ -56,13 +56,21 @@ class Symbol(ABC):
 
     Interpretation and execution are handled externally.
     """
-    @abstractmethod
+    __slots__ = () # subclasses that declare their own slots stay free of an instance dict
     def __init__(self, *args):
         pass
 
     @classmethod
     def args(cls) -> List[str]:
-        """Returns a list of argument names from the class's __init__ method."""
+        """
+        Returns a list of argument names from the class's __init__ method.
+
+        The signature is only inspected the first time; the pattern is cached on
+        the class itself and must not be mutated by callers.
+        """
+        cached = cls.__dict__.get("_pattern")
+        if cached is not None:
+            return cached
         result = []
         sig = inspect.signature(cls.__init__)
         annotations = get_type_hints(cls.__init__)
@@ -79,6 +87,7 @@ class Symbol(ABC):
             else:
                 expected = annotation
             result.append(expected)
+        cls._pattern = result
         return result
 
     def __eq__(self, other: object) -> bool:
@@ -87,7 +96,7 @@ class Symbol(ABC):
         return self.__class__ == other.__class__
 
     def __repr__(self):
-        return f"{self.__class__.__name__}(%s)"
+        return f"{self.__class__.__name__}()"
 
 class Value(Symbol):
     """
@@ -98,15 +107,15 @@ class Value(Symbol):
     in the module docstring. This enables grammars to express language literals while
     keeping the compiler agnostic to specific value types.
     """
+    __slots__ = ("value",)
     def __init__(self, value: Any):
         """Initialize with a value based on type."""
         super().__init__()
         self.value = self.type(value)
 
     @property
-    @abstractmethod
     def type(self) -> Any:
-        pass
+        raise NotImplementedError(f"{self.__class__.__name__} does not define a value type.")
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Value):
@@ -118,6 +127,7 @@ class Value(Symbol):
 
 class SymbolReplace(Exception):
     """Thrown when a Symbol needs to be replaced during compilation."""
+    __slots__ = ("new",)
     def __init__(self, new: Symbol | List[Symbol]):
         self.new = new
 
@@ -153,12 +163,18 @@ class Firestarter:
     Parameters:
         grammar (Grammar): The grammar used to parse input source code.
         strict (bool): Whether to enforce type checking on arguments (default: True).
+        cacheSize (int): How many parsed sources to keep for reuse (default: 256).
     """
-    def __init__(self, grammar: Grammar, strict: bool = True):
+    def __init__(self, grammar: Grammar, strict: bool = True, cacheSize: int = 256):
         self.opcodes = {}
+        self.handlers: Dict[str, Tuple[Type[Symbol], List[Any], List[Symbol] | None]] = {} # opcode, pattern and defaults by name
         self.constants = {}
         self.grammar = grammar
         self.strict = strict
+        self.parsed: Dict[str, AST] = {} # ASTs by source, so repeated sources skip the parse
+        self.parsedWith = grammar # the grammar the cached ASTs came from
+        self.cacheSize = cacheSize
+        self.checks = {}
 
     def __repr__(self):
         return f"Firestarter(opcodes={list(self.opcodes.keys())}, strict={self.strict})"
@@ -172,7 +188,9 @@ class Firestarter:
             raise TypeError(f"Expected a Symbol class, got {op.__name__}")
         if not name:
             name = op.__name__
+        name = sys.intern(name) # matched against interned rule identities on every node
         self.opcodes[name] = (op, None)
+        self.handlers.pop(name, None)
         return self
 
     def registerDefaults(self, name: str, *args: Symbol | Type[Any]):
@@ -184,8 +202,39 @@ class Firestarter:
             raise ValueError(f"Operation {name} not registered.")
         op, _ = self.opcodes[name]
         self.opcodes[name] = (op, list(args))
+        self.handlers.pop(name, None)
         return self
 
+    def checker(self, expected: Any):
+        """
+        Returns a predicate testing whether an argument satisfies `expected`.
+
+        The predicate is specialized for the kind of expected type when it is first
+        requested and cached, so argument matching does not walk through every case
+        for each argument.
+        """
+        check = self.checks.get(expected)
+        if check is not None:
+            return check
+        # Any
+        if expected is Any:
+            def check(arg):
+                return True
+        # UnionType
+        elif type(expected) is UnionType:
+            options = [self.checker(sub) for sub in get_args(expected)]
+            def check(arg):
+                return any(option(arg) for option in options)
+        else:
+            def check(arg):
+                # Value.type special case
+                if isinstance(arg, Value) and issubclass(arg.type, expected):
+                    return True
+                # Basic Match
+                return isinstance(arg, expected)
+        self.checks[expected] = check
+        return check
+
     def compile(self, tokens: str, asType: type = list):
         """
         Compile a source string into a concrete representation of operations.
@@ -210,15 +259,46 @@ class Firestarter:
     def parseTokens(self, tokens: str):
         """
         Parse a string of tokens into an abstract syntax tree (AST) using the registered grammar.
+
+        Successful parses are cached by source, so compiling the same tokens again
+        reuses the AST instead of running the grammar a second time. The cache keeps
+        the `cacheSize` most recently used sources, and is dropped if the grammar is
+        replaced or has rules registered on it since it last parsed.
         """
+        if self.grammar is not self.parsedWith or self.grammar.dirty: # dirty until the grammar resolves its new rules in parse
+            self.invalidate()
+        ast = self.parsed.pop(tokens, None)
+        if ast is not None:
+            self.parsed[tokens] = ast # move to the back, least recently used stays in front
+            return ast
         try:
             ast = self.grammar.parse(tokens)
         except GrammarError as e:
-            raise FirestarterError(f"Failed to parse tokens: {e}")
+            raise FirestarterError(f"Failed to parse tokens: {e}") from e
         if not ast:
             raise FirestarterError("No valid AST generated from tokens.")
+        if len(self.parsed) >= self.cacheSize:
+            if self.cacheSize <= 0:
+                return ast
+            del self.parsed[next(iter(self.parsed))]
+        self.parsed[tokens] = ast
         return ast
 
+    def invalidate(self, tokens: Optional[str] = None):
+        """
+        Drop the cached AST for `tokens`, or every cached AST if no tokens are given.
+
+        Needed only when the grammar is changed in place other than by registering
+        rules, such as its flags or a rule's strictness, as replacing the grammar or
+        registering on it invalidates the cache by itself.
+        """
+        if tokens is None:
+            self.parsed.clear()
+            self.parsedWith = self.grammar
+        else:
+            self.parsed.pop(tokens, None)
+        return self
+
     def compileAst(self, ast: AST, asType: type = list):
         """
         Compiles a source AST into a concrete representation of operations.
@@ -237,37 +317,38 @@ class Firestarter:
             asType (type): A callable that accepts the final list of operations and
                         returns a reified object representing the compiled result.
         """
-        def getPattern(op, pattern: List[Type[Symbol]], args: List[Symbol], defaults: List[Symbol | None]):
-            def typeCheck(arg, expected):
-                if not self.strict:
-                    return True
-                # Any
-                if expected is Any:
-                    return True
-                # UnionType
-                if type(expected) is UnionType:
-                    for sub in get_args(expected):
-                        if typeCheck(arg, sub):
-                            return True
-                    return False
-                # Value.type special case
-                if isinstance(arg, Value):
-                    if issubclass(arg.type, expected):
-                        return True
-                # Basic Match
-                return isinstance(arg, expected)
-
-            result = []
-
-            for i, p in enumerate(pattern):
+        def prepare(pattern: List[Type[Symbol]]):
+            """
+            Classify each expected type once, so nodes don't unpack the annotations again,
+            and bind its predicate alongside so it isn't fetched from the checker per argument.
+            """
+            prepared = []
+            for p in pattern:
                 origin = get_origin(p)
                 inner = get_args(p)
+                optional = inner if origin is Union and type(None) in inner else None
+                variadic = (inner[0] if inner else object) if origin in (list, List) else None
+                check = checker(optional if optional is not None else variadic if variadic is not None else p)
+                prepared.append((p, optional, variadic, check))
+            return tuple(prepared)
+
+        # strictness is fixed for the compile, so pick the check once rather than testing it per argument
+        if self.strict:
+            def typeCheck(arg, check):
+                return check(arg)
+        else:
+            def typeCheck(arg, check):
+                return True
+
+        def getPattern(op, pattern: Tuple[Tuple[Any, Tuple | None, Any, Callable], ...], args: List[Symbol], defaults: List[Symbol | None]):
+            result = []
 
+            for i, (p, inner, expected, check) in enumerate(pattern):
                 # Optional[T]
-                if origin is Union and type(None) in inner:
+                if inner is not None:
                     if len(args) < len(pattern):
                         if i < len(defaults or []):
-                            if typeCheck(defaults[i], inner):
+                            if typeCheck(defaults[i], check):
                                 result.append(defaults[i])
                             else:
                                 raise FirestarterError(f"Argument {defaults[i]} does not match expected type {inner} for {op.__name__}.") 
@@ -276,12 +357,11 @@ class Firestarter:
                         continue
 
                 # List[T]
-                if origin in (list, List):
-                    expected = inner[0] if inner else object
+                if expected is not None:
                     #if i >= len(args):
                     #    raise FirestarterError(f"Missing required arguments for variadic {op.__name__}.")
                     remaining = args[i:]
-                    if not all(typeCheck(arg, expected) for arg in remaining):
+                    if not all(typeCheck(arg, check) for arg in remaining):
                         raise FirestarterError(f"Expected list of {expected.__name__} for {op.__name__}.")
                     result.extend(remaining)
                     break # List must be last in pattern
@@ -289,7 +369,7 @@ class Firestarter:
                 # Simple required type (Symbol subclass or base type)
                 if i >= len(args):
                     raise FirestarterError(f"Missing required argument {i} for {op.__name__}.")
-                if typeCheck(args[i], p):
+                if typeCheck(args[i], check):
                     result.append(args[i])
                 else:
                     raise FirestarterError(f"Argument {args[i]} does not match expected type {p} for {op.__name__}.")
@@ -299,50 +379,66 @@ class Firestarter:
                 return e.new
             return result
 
-        stack: List[Tuple[Match,int,List]] = []
+        def reduce(node: Match, name: str, args: List[Symbol]):
+            handler = handlers.get(name)
+            if handler is None:
+                opcode = opcodes.get(name)
+                if opcode is None:
+                    raise FirestarterError(f"Error on line {lineNumbers[index]}: operation {name} not registered.")
+                op, defaults = opcode
+                handler = handlers[name] = (op, prepare(op.args()), defaults)
+            op, pattern, defaults = handler
+            try:
+                return getPattern(op, pattern, args, defaults) # type checking an optional injection
+            except FirestarterError as e:
+                raise FirestarterError(f"Error on line {lineNumbers[index]}: {e}") from e
+            except Exception as e:
+                raise FirestarterError(f"Error on line {lineNumbers[index]}: {node.slice(tokens).strip()}\n{e}") from e
+
+        checker = self.checker
+        stack: List[Tuple[Match,Iterator[Match],str,List]] = []
         results = []
         lineNumbers = ast.lineNumbers
+        opcodes = self.opcodes
+        handlers = self.handlers # resolved on first use and kept across compiles
+        tokens = ast.tokens
 
-        for node in ast.matches:
-            stack.append((node,0,[node.rule.identity]))
+        for index, node in enumerate(ast.matches): # line numbers are indexed, not consumed, so the AST can be compiled again
+            stack.append((node,iter(node.children),node.rule.identity,[]))
 
             while stack:
-                node, i, args = stack[-1] # look at last node
-
-                if i == len(node.children): # finished traveral? push to previous scope
-                    name = args.pop(0)  # get operation name
-                    if name not in self.opcodes:
-                        raise FirestarterError(f"Error on line {lineNumbers.pop(0)}: operation {name} not registered.")
-                    op, defaults = self.opcodes[name]
-
-                    pattern = op.args()
-                    try:
-                        output = getPattern(op, pattern, args, defaults) # type checking an optional injection
-                    except FirestarterError as e:
-                        raise FirestarterError(f"Error on line {lineNumbers.pop(0)}: {e}")
-                    except Exception as e:
-                        raise FirestarterError(f"Error on line {lineNumbers.pop(0)}: {node.slice(ast.tokens).strip()}\n{e}")
+                node, children, name, args = stack[-1] # look at last node
+                child = next(children, None)
+
+                if child is None: # finished traveral? push to previous scope
+                    output = reduce(node, name, args)
                     stack.pop()  # pop current node from stack
                     if stack:
                         if isinstance(output, list):
-                            stack[-1][2].extend(output)
+                            stack[-1][3].extend(output)
                         else:
-                            stack[-1][2].append(output)
+                            stack[-1][3].append(output)
                     else:
-                        number = lineNumbers.pop(0)
+                        number = lineNumbers[index]
                         if isinstance(output, list):
                             for item in output:
                                 results.append((number, item))
                         else:
                             results.append((number, output))
                 else:
-                    child = node.children[i]
-                    stack[-1] = (node, i + 1, args)  # increment index for next iteration
                     identity = child.rule.identity
-                    if identity not in self.opcodes:
-                        raise FirestarterError(f"Error on line {lineNumbers.pop(0)}: operation {identity} not registered.")
+                    if identity not in opcodes:
+                        raise FirestarterError(f"Error on line {lineNumbers[index]}: operation {identity} not registered.")
                     if isinstance(child.rule, RulePrimitive): # Primitive node, directly append to results
-                        stack.append((child,0,[identity,child.slice(ast.tokens)]))
+                        if child.children:
+                            stack.append((child,iter(child.children),identity,[child.slice(tokens)]))
+                            continue
+                        # leaf primitive, reduce it in place rather than pushing and popping a frame
+                        output = reduce(child, identity, [child.slice(tokens)])
+                        if isinstance(output, list):
+                            args.extend(output)
+                        else:
+                            args.append(output)
                     else: # Non-primitive node, push to stack for further processing
-                        stack.append((child,0,[identity]))
+                        stack.append((child,iter(child.children),identity,[]))
         return asType(results)
\ No newline at end of file
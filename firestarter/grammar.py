@@ -1,7 +1,11 @@
-from typing import Callable, Generator, Type, Dict, Set, Tuple, List, Any
-from abc import ABC, abstractmethod
+from typing import Callable, Generator, Type, Dict, Set, FrozenSet, Tuple, List, Any
+from collections import deque
+from contextvars import ContextVar
 import copy
+import hashlib
+import pickle
 import re
+import sys
 
 class Match:
     """
@@ -10,17 +14,22 @@ class Match:
     Stores the rule, and the start and end indices into the token list for the matched span.
     The token stream itself is not stored; all context is derived from the original input.
     """
+    __slots__ = ("rule", "start", "end", "children", "error") # one is built per rule attempt, skip the instance dict
     def __init__(self, rule: "Rule", start: int, end: int, children: "List[Match] | None" = None, lasterror: "MatchError | None" = None):
         self.rule = rule
         self.start = start
         self.end = end
-        self.children = children or []
+        self.children = children or ()  # leaves share the empty tuple instead of allocating a list
         self.error = lasterror
 
     def walk(self) -> Generator["Match", None, None]:
-        yield self
-        for child in self.children:
-            yield from child.walk()
+        """Yield this match and everything under it in pre-order."""
+        # an explicit stack, nested generators resume every level above a node to yield it
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
 
     def slice(self, tokens: str) -> str:
         """Return the matched text from the input token stream."""
@@ -54,33 +63,53 @@ class MatchError(Exception):
     from any failed sub-rules (such as choices or alternatives). This lets you see
     the full trace of unsuccessful parsing attempts and understand why the parse failed.
     """
-    def __init__(self, pos: int, expected: "Rule", children: "List[MatchError] | None" = None, matched: "List[Match] | None" = None):
+    __slots__ = ("pos", "expected", "_children", "pending", "matched", "parent") # raised on every backtrack, skip the instance dict
+    def __init__(self, pos: int, expected: "Rule", children: "List[MatchError] | None" = None, matched: "List[Match] | None" = None,
+                 pending: "Callable[[], List[MatchError]] | None" = None):
         self.pos = pos
         self.expected = expected
-        self.children = children or []
+        self._children = children = children or ()
+        self.pending = pending # builds the children on first read instead, most errors are discarded by backtracking unread
         self.matched = matched
         self.parent: MatchError | None = None  # Parent MatchError, if any
-        for child in self.children:
+        for child in children:
             child.parent = self
 
+    @property
+    def children(self) -> "List[MatchError]":
+        if self.pending is not None:
+            self._children, self.pending = self.pending(), None
+            for child in self._children:
+                child.parent = self
+        return self._children
+
+    @children.setter
+    def children(self, children: "List[MatchError]"):
+        self._children, self.pending = children, None
+
     def walk(self) -> Generator["MatchError", None, None]:
-        yield self
-        for child in self.children:
-            yield from child.walk()
+        """Yield this error and everything under it in pre-order."""
+        # an explicit stack, nested generators resume every level above a node to yield it
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
 
     def __repr__(self):
         return f"MatchError(pos={self.pos+1}, expected={self.expected}, matched={self.matched})"
 
     def __str__(self):
-        def render(err, depth=0):
-            out = f"{' ' * depth}{err!r}\n"
+        def render(err, depth, out):
+            out.append(f"{' ' * depth}{err!r}")
             for child in err.children:
-                out += render(child, depth + 2)
+                render(child, depth + 2, out)
             return out
-        return render(self).rstrip()
+        return "\n".join(render(self, 0, [])).rstrip()
 
+MEMO: ContextVar[Dict[Tuple[int, int], Match] | None] = ContextVar("MEMO", default=None) # successful matches of the current parse, see Rule.memoize
 
-class Rule(ABC):
+class Rule:
     """
     Abstract base class for grammar rules used in parsing.
 
@@ -93,13 +122,37 @@ class Rule(ABC):
         self.identity: str | None = None  # identifier for the rule for reverse lookup
         self.strict: bool = False # suspends ignores when true, srictly parsed
 
+    @property
+    def strict(self) -> bool:
+        return self._strict
+
+    @strict.setter
+    def strict(self, value: bool):
+        # bind consume and attempt once here so each call is a single frame with no strict check
+        self._strict = value
+        self.consume = self._consumeStrict if value else self._consume
+        self.attempt = self._attemptStrict if value else self._attempt
+
     def consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
         """Consume tokens based on the rule."""
         if self.strict:
             ignore = None
         return self._consume(tokens, pos, ignore)
 
-    @abstractmethod
+    def attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> "Match | MatchError":
+        """Like consume, but a failure is returned as a MatchError instead of raised."""
+        if self.strict:
+            ignore = None
+        return self._attempt(tokens, pos, ignore)
+
+    def _consumeStrict(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
+        """Consume tokens with ignores suspended."""
+        return self._consume(tokens, pos, None)
+
+    def _attemptStrict(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> "Match | MatchError":
+        """Attempt to match with ignores suspended."""
+        return self._attempt(tokens, pos, None)
+
     def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
         """
         Checks whether this rule matches the input token stream at position `pos`.
@@ -111,8 +164,54 @@ class Rule(ABC):
         raises MatchError, it is caught, wrapped with this rule's context, and
         re-raised. This preserves a full chain of failure states for debugging
         and parser diagnostics.
+
+        Subclasses implement either this or `_attempt`; the built-in rules implement
+        `_attempt`, and this raises the MatchError it returns.
         """
-        pass
+        if self.__class__._attempt is Rule._attempt: # neither is implemented, each default would call the other
+            raise NotImplementedError(f"{self.__class__.__name__} must implement _consume or _attempt.")
+        result = self._attempt(tokens, pos, ignore)
+        if result.__class__ is MatchError:
+            raise result
+        return result
+
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> "Match | MatchError":
+        """
+        The non-raising form of `_consume`: the MatchError for a failed match is returned.
+
+        Backtracking is the common case while parsing, and returning the error skips
+        raising and unwinding it through every rule on the way up.
+        """
+        try:
+            return self._consume(tokens, pos, ignore)
+        except MatchError as e:
+            return e
+
+    memoized: Callable[..., "Match | MatchError"] | None = None
+
+    def memoize(self) -> "Rule":
+        """
+        Remember successful matches in the memo of the parse in progress, so backtracking
+        into this rule again at the same place reuses the match instead of parsing it
+        twice. Outside a parse the rule matches as before. Wraps the current attempt, so
+        strictness should be set first.
+        """
+        self.memoized = self.attempt
+        self.attempt = self._attemptMemo
+        return self
+
+    def _attemptMemo(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> "Match | MatchError":
+        """Attempt through the parse's memo, keyed by rule, position and whether ignores apply."""
+        memo = MEMO.get()
+        if memo is None:
+            return self.memoized(tokens, pos, ignore)
+        key = (id(self), pos if ignore else ~pos)
+        match = memo.get(key)
+        if match is None:
+            match = self.memoized(tokens, pos, ignore)
+            if match.__class__ is Match and match.end != pos: # an empty match could be reused twice in one tree, and flattening isn't repeatable
+                memo[key] = match
+        return match
 
     def duplicate(self) -> "Rule":
         """Create a duplicate of this rule."""
@@ -121,10 +220,22 @@ class Rule(ABC):
     def __eq__(self, other):
         return isinstance(other, Rule) and self.__class__ == other.__class__
 
+    def describe(self) -> str:
+        """Return the rule-specific part of the representation."""
+        return ""
+
+    def first(self, seen: Set[int]) -> FrozenSet[str] | None:
+        """
+        The characters a match of this rule can start with once ignores are skipped, or
+        None if that isn't known. A known set also means the rule never matches empty.
+        `seen` holds the rules already being asked, so recursive grammars stop.
+        """
+        return None
+
     def __repr__(self):
         if self.identity:
-            return f"{self.identity}<{self.__class__.__name__}>(%s)"
-        return f"{self.__class__.__name__}(%s)"
+            return f"{self.identity}<{self.__class__.__name__}>({self.describe()})"
+        return f"{self.__class__.__name__}({self.describe()})"
 
 
 class RuleReference(Rule):
@@ -134,40 +245,48 @@ class RuleReference(Rule):
     The reference can be resolved later to point to the actual rule object.
     """
     def __init__(self, identifier: str):
-        self.identity = identifier
+        self.identity = sys.intern(identifier)
 
     def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
         raise NotImplementedError(
             f"Unresolved rule reference '{self.identity}' in grammar. "
             "Check that all rules are defined.")
 
-    def __repr__(self):
-        return super().__repr__().replace("%s", str(self.identity))
+    def describe(self) -> str:
+        return str(self.identity)
 
 # primitive rules
 
-class RulePrimitive(Rule, ABC):
+class RulePrimitive(Rule):
     """Abstract base class for primitive rules that match a specific pattern of lexemes."""
     def __init__(self, pattern: Any):
         super().__init__()
         self.pattern = pattern
 
+    def describe(self) -> str:
+        return str(self.pattern)
+
 
 class RuleString(RulePrimitive):
     """A rule that matches a specific string."""
     def __init__(self, text: str):
         super().__init__(text)
+        self.length = len(text)
 
-    def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match | MatchError:
         """Consume tokens based on the rule."""
-        if ignore and ignore.match(tokens, pos):
-            pos = ignore.match(tokens, pos).end()
-        if pos < len(tokens) and tokens.startswith(self.pattern, pos):
-            return Match(self, pos, pos + len(self.pattern))
-        raise MatchError(pos, self)
-
-    def __repr__(self):
-        return super().__repr__().replace("%s", self.pattern)
+        if ignore:
+            skipped = ignore.match(tokens, pos)
+            if skipped:
+                pos = skipped.end()
+        if tokens.startswith(self.pattern, pos) and pos < len(tokens): # most attempts miss, so the bound is only checked on a hit
+            return Match(self, pos, pos + self.length)
+        return MatchError(pos, self)
+
+    def first(self, seen: Set[int]) -> FrozenSet[str] | None:
+        if self.strict or not self.pattern:
+            return None # a strict rule doesn't skip ignores, so the character after them says nothing
+        return frozenset(self.pattern[0])
 
     def __eq__(self, other):
         return super().__eq__(other) and self.pattern == other.pattern
@@ -177,26 +296,26 @@ class RulePattern(RulePrimitive):
     """A rule that matches a regular expression pattern."""
     def __init__(self, pattern: re.Pattern):
         self.regex = pattern
+        self.match = pattern.match # bound once, consume calls it on every attempt
         super().__init__(pattern.pattern.replace("\\\\", "\\"))  # escape backslashes for display
 
-    def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match | MatchError:
         """Match if the pattern can consume tokens starting at pos."""
-        if ignore and ignore.match(tokens, pos):
-            pos = ignore.match(tokens, pos).end()
-        match = self.regex.match(tokens, pos)
+        if ignore:
+            skipped = ignore.match(tokens, pos)
+            if skipped:
+                pos = skipped.end()
+        match = self.match(tokens, pos)
         if match:
             return Match(self, pos, match.end())
-        raise MatchError(pos, self)
-
-    def __repr__(self):
-        return super().__repr__().replace("%s", str(self.pattern))
+        return MatchError(pos, self)
 
     def __eq__(self, other):
         return super().__eq__(other) and self.pattern == other.pattern
 
 # single rules
 
-class RuleSingle(Rule, ABC):
+class RuleSingle(Rule):
     """A rule that matches a single occurrence of another rule."""
     def __init__(self, rule: Rule | str):
         super().__init__()
@@ -205,104 +324,116 @@ class RuleSingle(Rule, ABC):
         else:
             self.rule = rule
 
+    def describe(self) -> str:
+        return repr(self.rule)
+
     def __eq__(self, other):
         return super().__eq__(other) and self.rule == other.rule
 
 
 class RuleOneOrMore(RuleSingle):
     """A rule that matches one or more occurrences of a rule."""
-    def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match | MatchError:
         """Match if the rule can consume one or more tokens."""
         matches = []
         start = pos
         error = None
-        while pos < len(tokens):
-            try:
-                match = self.rule.consume(tokens, pos, ignore)
-                matches.append(match)
-                pos = match.end
-            except MatchError as e:
-                error = e
-                if matches:  # If we have matched at least one token, return the match
-                    break
-                raise MatchError(pos, self, [e])  # If no tokens matched, raise an error
+        attempt = self.rule.attempt
+        length = len(tokens)
+        while pos < length:
+            match = attempt(tokens, pos, ignore)
+            if match.__class__ is MatchError:
+                if not matches:
+                    return MatchError(pos, self, [match])  # If no tokens matched, fail
+                error = match
+                break
+            matches.append(match)
+            pos = match.end
         if not matches:
-            raise MatchError(pos, self)
+            return MatchError(pos, self)
         return Match(self, start, pos, matches, lasterror = error)
 
-    def __repr__(self):
-        return super().__repr__().replace("%s", repr(self.rule))
+    def first(self, seen: Set[int]) -> FrozenSet[str] | None:
+        if self.strict or id(self) in seen:
+            return None
+        seen.add(id(self))
+        first = self.rule.first(seen)
+        seen.discard(id(self))
+        return first
 
 
 class RuleZeroOrMore(RuleSingle):
     """A rule that matches zero or more occurrences of a rule."""
-    def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match | MatchError:
         """Match if the rule can consume zero or more tokens."""
         matches = []
         start = pos
         error = None
-        while pos < len(tokens):
-            try:
-                match = self.rule.consume(tokens, pos, ignore)
-                matches.append(match)
-                pos = match.end
-            except MatchError as e:
-                error = e
+        attempt = self.rule.attempt
+        length = len(tokens)
+        while pos < length:
+            match = attempt(tokens, pos, ignore)
+            if match.__class__ is MatchError:
+                error = match
                 break
+            matches.append(match)
+            pos = match.end
         return Match(self, start, pos, matches, lasterror = error)
 
-    def __repr__(self):
-        return super().__repr__().replace("%s", repr(self.rule))
-
 
 class RuleOptional(RuleSingle):
     """A rule that matches zero or one occurrence of a rule."""
-    def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match | MatchError:
         """Match if the rule can consume zero or one token."""
-        try:
-            match = self.rule.consume(tokens, pos, ignore)
-            return Match(self, match.start, match.end, [match])
-        except MatchError as e:
-            return Match(self, pos, pos, lasterror = e)
-
-    def __repr__(self):
-        return super().__repr__().replace("%s", repr(self.rule))
+        match = self.rule.attempt(tokens, pos, ignore)
+        if match.__class__ is MatchError:
+            return Match(self, pos, pos, lasterror = match)
+        return Match(self, match.start, match.end, [match])
 
 # Predicates
 
-class RulePredicate(RuleSingle, ABC):
-    """Abstract base class for predicates that check conditions on rules."""
+class RulePredicate(RuleSingle):
+    r"""
+    Abstract base class for predicates that check conditions on rules.
 
-class RuleAndPredicate(RulePredicate):
-    """A rule that succeeds if the inner rule matches, but consumes no tokens."""
-    def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
+    The inner rule is tried without the parse's memo. A lookahead's match stays in the
+    tree beside the real match that follows it, so they can't share a Match object,
+    flattening one would rewrite the other.
+
+    >>> grammar = make_grammar('S <- ( &Word Word )+\nWord <- Letter Letter\nLetter <> ~"[a-z]"', Flags.IGNORE_WHITESPACE | Flags.FLATTEN)
+    >>> [(match.rule.identity, match.start, match.end) for match in grammar.parse("abcd").first().children]
+    [('Word', 0, 2), ('Word', 0, 2), ('Word', 2, 4), ('Word', 2, 4)]
+    """
+    def lookahead(self, tokens: str, pos: int, ignore: re.Pattern | None) -> Match | MatchError:
+        """Attempt the inner rule with memoization suspended."""
+        memo = MEMO.set(None)
         try:
-            match = self.rule.consume(tokens, pos, ignore)  # Try matching inner rule, never ignore tokens all are considered significant
-            # If successful, return a zero-width match at pos
-            return Match(self, pos, pos, [match])
-        except MatchError as e:
-            raise MatchError(pos, self, [e])
+            return self.rule.attempt(tokens, pos, ignore)
+        finally:
+            MEMO.reset(memo)
 
-    def __repr__(self):
-        return super().__repr__().replace("%s", repr(self.rule))
+class RuleAndPredicate(RulePredicate):
+    """A rule that succeeds if the inner rule matches, but consumes no tokens."""
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match | MatchError:
+        match = self.lookahead(tokens, pos, ignore)  # Try matching inner rule, never ignore tokens all are considered significant
+        if match.__class__ is MatchError:
+            return MatchError(pos, self, [match])
+        # If successful, return a zero-width match at pos
+        return Match(self, pos, pos, [match])
 
 
 class RuleNotPredicate(RulePredicate):
     """A rule that succeeds if the inner rule does not match, but consumes no tokens."""
-    def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
-        try:
-            match = self.rule.consume(tokens, pos, ignore)
-        except MatchError as e:
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match | MatchError:
+        match = self.lookahead(tokens, pos, ignore)
+        if match.__class__ is MatchError:
             # If it fails, return a zero-width match at pos
-            return Match(self, pos, pos, lasterror = e)
-        raise MatchError(pos, self, None, [match])  # If the inner rule matches, raise an error
-
-    def __repr__(self):
-        return super().__repr__().replace("%s", repr(self.rule))
+            return Match(self, pos, pos, lasterror = match)
+        return MatchError(pos, self, None, [match])  # If the inner rule matches, fail
 
 # group rules
 
-class RuleMultiple(Rule, ABC):
+class RuleMultiple(Rule):
     """A rule that matches multiple occurrences of other rules."""
     def __init__(self, *rules: Rule | str):
         super().__init__()
@@ -310,6 +441,19 @@ class RuleMultiple(Rule, ABC):
             RuleReference(rule) if isinstance(rule, str) else rule
             for rule in rules
         ]
+        self.attempts: Tuple[Callable[..., Match | MatchError], ...] | None = None
+
+    def bind(self) -> Tuple[Callable[..., Match | MatchError], ...]:
+        """
+        Bind the attempt method of each child rule once, so matching doesn't look it
+        up per child per attempt. Grammar.resolve rebinds after references are replaced;
+        changing a child rule or its strictness afterwards needs another bind.
+        """
+        self.attempts = tuple(rule.attempt for rule in self.rules)
+        return self.attempts
+
+    def describe(self) -> str:
+        return ", ".join(rule.__class__.__name__ for rule in self.rules)
 
     def __eq__(self, other):
         return super().__eq__(other) and self.rules == other.rules
@@ -317,40 +461,91 @@ class RuleMultiple(Rule, ABC):
 
 class RuleAll(RuleMultiple):
     """A rule that matches all tokens in the input."""
-    def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match | MatchError:
         """Match if all rules can consume tokens starting at pos."""
         matches = []
         start = pos
-        for rule in self.rules:
-            try:
-                match = rule.consume(tokens, pos, ignore)
-                matches.append(match)
-                pos = match.end
-            except MatchError as e:
-                raise MatchError(pos, self, [e], matches)
+        for attempt in self.attempts or self.bind():
+            match = attempt(tokens, pos, ignore)
+            if match.__class__ is MatchError:
+                return MatchError(pos, self, [match], matches)
+            matches.append(match)
+            pos = match.end
         return Match(self, start, pos, matches)
 
-    def __repr__(self):
-        rules_repr = ", ".join(rule.__class__.__name__ for rule in self.rules)
-        return super().__repr__().replace("%s", rules_repr)
+    def first(self, seen: Set[int]) -> FrozenSet[str] | None:
+        if self.strict or not self.rules or id(self) in seen:
+            return None
+        seen.add(id(self))
+        first = self.rules[0].first(seen)
+        seen.discard(id(self))
+        return first
 
 
 class RuleChoice(RuleMultiple):
     """A rule that matches one of several alternatives."""
-    def _consume(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match:
-        """Match if any of the rules can consume tokens starting at pos."""
-        unmatched = []
-        for rule in self.rules:
-            try:
-                match = rule.consume(tokens, pos, ignore)
-                return Match(self, match.start, match.end, [match])
-            except MatchError as e:
-                unmatched.append(e)
-        raise MatchError(pos, self, unmatched)
+    def __init__(self, *rules: Rule | str, anchored: bool = False):
+        super().__init__(*rules)
+        self.anchored = anchored # spans start where the choice was tried, as a sequence's would, not where the alternative matched
+        self.table: Dict[str, Tuple[int, ...]] | None = None # alternatives worth trying by next character, see dispatch
+        self.fallback: Tuple[int, ...] = ()
 
-    def __repr__(self):
-        rules_repr = ", ".join(rule.__class__.__name__ for rule in self.rules)
-        return super().__repr__().replace("%s", rules_repr)
+    def dispatch(self):
+        """
+        Group the alternatives by the first character they can match, so an attempt
+        only tries the ones that can start with the next character. The children must
+        be resolved, so Grammar.resolve calls this once every reference is replaced.
+        """
+        self.table = None
+        firsts = [rule.first({id(self)}) for rule in self.rules]
+        known = [first for first in firsts if first is not None]
+        if len(self.rules) < 2 or not known:
+            return
+        self.fallback = tuple(index for index, first in enumerate(firsts) if first is None)
+        self.table = {
+            char: tuple(index for index, first in enumerate(firsts) if first is None or char in first)
+            for char in frozenset().union(*known)
+        }
+
+    def first(self, seen: Set[int]) -> FrozenSet[str] | None:
+        if self.strict or id(self) in seen:
+            return None
+        seen.add(id(self))
+        firsts = [rule.first(seen) for rule in self.rules]
+        seen.discard(id(self))
+        if not firsts or None in firsts:
+            return None
+        return frozenset().union(*firsts)
+
+    def _attempt(self, tokens: str, pos: int = 0, ignore: re.Pattern | None = None) -> Match | MatchError:
+        """Match if any of the rules can consume tokens starting at pos."""
+        attempts = self.attempts or self.bind()
+        table = self.table
+        if table is None:
+            unmatched = []
+            for attempt in attempts:
+                match = attempt(tokens, pos, ignore)
+                if match.__class__ is MatchError:
+                    unmatched.append(match)
+                    continue
+                return Match(self, pos if self.anchored else match.start, match.end, [match])
+            return MatchError(pos, self, unmatched)
+        at = pos
+        if ignore:
+            skipped = ignore.match(tokens, pos)
+            if skipped:
+                at = skipped.end()
+        failed = {}
+        for index in table.get(tokens[at:at + 1], self.fallback):
+            match = attempts[index](tokens, pos, ignore)
+            if match.__class__ is MatchError:
+                failed[index] = match
+                continue
+            return Match(self, pos if self.anchored else match.start, match.end, [match])
+        def pending() -> List[MatchError]:
+            # the skipped alternatives fail on their first character, trying them gives the error every alternative in order
+            return [failed[index] if index in failed else attempt(tokens, pos, ignore) for index, attempt in enumerate(attempts)]
+        return MatchError(pos, self, pending = pending)
 
 
 class AST:
@@ -380,16 +575,17 @@ class AST:
     def pretty_print(self, highlight: str = "\033[94m"):
         """Pretty print the match tree, showing the rule and matched text."""
         reset = "\033[0m"
-        def render(match: Match, tokens, depth=0):
+        def render(match: Match, tokens, out: List[str], depth=0):
+            # lines go into one shared buffer, concatenating subtrees copies them once per level
             if issubclass(match.rule.__class__, RulePrimitive):
-                out = f"{' ' * depth}{highlight}{match.rule.identity}<{match.rule.__class__.__name__}>{reset}:{match.slice(tokens)!r}\n"
+                out.append(f"{' ' * depth}{highlight}{match.rule.identity}<{match.rule.__class__.__name__}>{reset}:{match.slice(tokens)!r}")
             else:
-                out = f"{' ' * depth}{highlight}{match.rule.identity}<{match.rule.__class__.__name__}>{reset}\n"
+                out.append(f"{' ' * depth}{highlight}{match.rule.identity}<{match.rule.__class__.__name__}>{reset}")
             for child in match.children:
-                out += render(child, tokens, depth + 2)
+                render(child, tokens, out, depth + 2)
             return out
         for match in self.matches:
-            print(render(match, self.tokens).rstrip())
+            print("\n".join(render(match, self.tokens, [])).rstrip())
 
 
 class GrammarError(Exception):
@@ -475,7 +671,10 @@ class GrammarParseError(GrammarError):
         expect = None
         header = None
         row, column = getLineInfo(self.tokens, lastError.pos)
-        line = self.tokens.split('\n')[row - 1]
+        # slice out the one line shown, rather than splitting the whole input to index it
+        start = self.tokens.rfind('\n', 0, lastError.pos) + 1
+        end = self.tokens.find('\n', lastError.pos)
+        line = self.tokens[start:end] if end != -1 else self.tokens[start:]
 
         expected = lastError.expected if lastError else None
 
@@ -525,6 +724,14 @@ class Flags:
     IGNORE_WHITESPACE = IGNORE_SPACE_AND_TAB | IGNORE_NEWLINE
     FLATTEN = 0x04
 
+class Flatten:
+    """Actions taken on a match while flattening, keyed by its rule identity."""
+    KEEP = 0
+    MERGE = 1
+    HOIST = 2
+    DISCARD = 3
+    CONDITIONAL = 4
+
 IGNORABLE = [
     None,
     re.compile(r'[ \t]+'),      # Matches whitespace only
@@ -555,10 +762,12 @@ class Grammar:
         self.merge = set() # rules that should be merged
         self.conditional = set() # rules that should be conditionally hoisted
         self.macros: Dict[str, str] = {} # used for parsing failures to provide better error messages
+        self.merged: Dict[Tuple[int, str], Tuple[Rule, Rule]] = {} # relabelled copies of merged rules, by rule id and identity
 
     def register(self, **kwargs: Rule | str):
         """Register a rule with the grammar."""
         for identifier, rule in kwargs.items():
+            identifier = sys.intern(identifier) # identities are hashed on every dispatch, keep one shared object per name
             if isinstance(rule, str):
                 self.rules[identifier] = RuleReference(rule)
             else:
@@ -573,6 +782,11 @@ class Grammar:
 
     def resolve(self):
         """Resolve all rule references in the grammar."""
+        self.merged.clear()
+        # named rules are memoized before the binds below, so their parents bind the memoized attempt
+        for rule in self.rules.values():
+            if rule.memoized is None and not isinstance(rule, (RuleReference, RulePrimitive)):
+                rule.memoize()
         def handle_rule(rule, callback):
             nonlocal stack, misses
             if isinstance(rule, RuleReference):
@@ -585,19 +799,20 @@ class Grammar:
             else:
                 stack.append(rule)
 
-        toVisit = [(identifier, base) for identifier, base in self.rules.items()]
+        toVisit = deque(self.rules.items())
+        choices: Dict[int, RuleChoice] = {}
         misses = 0
         while toVisit:
             if misses == len(self.rules):
                 raise GrammarError(f"Circular dependency detected in grammar rules. Triggered by: {toVisit[-1][0]}")
-            identifier, base = toVisit.pop(0)
-            stack, visited = [base], []
+            identifier, base = toVisit.popleft()
+            stack, visited = [base], set()
             try:
                 while stack:
                     this = stack.pop()
-                    if this in visited:
-                            continue
-                    visited.append(this)
+                    if id(this) in visited: # by identity, structural Rule.__eq__ is deep and treats distinct rules as seen
+                        continue
+                    visited.add(id(this))
                     if isinstance(this, RuleReference):
                         self.rules[identifier] = self.rules[this.identity]
                     elif isinstance(this, RuleSingle):
@@ -607,38 +822,50 @@ class Grammar:
                         for i, rule in enumerate(this.rules):
                             def assign(x, i=i): this.rules.__setitem__(i, x) # type: ignore
                             handle_rule(rule, assign)
+                        this.bind()
+                        if isinstance(this, RuleChoice):
+                            choices[id(this)] = this
             except GrammarDeferResolve as e:
                 toVisit.append((identifier, base))
+        for choice in choices.values(): # needs every reference replaced, not just this rule's own
+            choice.dispatch()
+        self.dirty = False
         return self
 
     def parse(self, tokens: str) -> AST:
-        def do_flatten(node: Match) -> List[Match]:
-            """Flatten AST by discarding scaffolding."""
-            if node.rule.identity in self.merge:
+        def do_flatten(node: Match, out: List[Match]) -> Match | None:
+            """
+            Flatten AST by discarding scaffolding. Hoisted matches are added straight to
+            `out`, the list their parent is building, and a kept match is returned.
+            """
+            action = actions.get(node.rule.identity, KEEP)
+            if action == MERGE:
                 child = node.children[0]
                 while child.children:
                     child = child.children[0]
-                child.rule = child.rule.duplicate()
-                child.rule.identity = node.rule.identity
+                key = (id(child.rule), node.rule.identity)
+                cached = merged.get(key)
+                if cached is None or cached[0] is not child.rule:
+                    duplicate = child.rule.duplicate()
+                    duplicate.identity = node.rule.identity
+                    cached = merged[key] = (child.rule, duplicate)
+                child.rule = cached[1]
                 return child
 
-            children = []
+            if action == DISCARD:
+                return None
 
-            for child in node.children:
-                child = do_flatten(child)
-                if child:
-                    if isinstance(child, list):
-                        children.extend(child)
-                    else:
-                        children.append(child)
+            children = out if action == HOIST else []
 
-            if node.rule.identity is None or node.rule.identity in self.hoist:
-                return children
+            for child in node.children:
+                child = do_flatten(child, children)
+                if child is not None and child.end != child.start: # zero-width matches are dropped, same as bool(match) without calling __len__
+                    children.append(child)
 
-            if node.rule.identity in self.discard:
-                return []
+            if action == HOIST:
+                return None
 
-            if node.rule.identity in self.conditional and len(children) == 1:
+            if action == CONDITIONAL and len(children) == 1:
                 return children[0]
 
             node.children = children
@@ -653,28 +880,48 @@ class Grammar:
         pos = 0
         matches: List[Match] = []
         ignore = IGNORABLE[self.flags & 0x03]
+        attempt = self.rule.attempt
+        length = len(tokens)
+        memo = MEMO.set({}) # scoped to this call, so parses in other threads or nested in this one don't share matches
         try:
-            while pos < len(tokens):
-                match = self.rule.consume(tokens, pos, ignore)
-                if len(match) == 0:
-                    raise match.error
+            while pos < length:
+                match = attempt(tokens, pos, ignore)
+                if match.__class__ is MatchError:
+                    raise GrammarParseError(self, matches, match, tokens)
+                if match.end == match.start:
+                    # an empty match only keeps an error if a repetition or option stopped on one
+                    raise GrammarParseError(self, matches, match.error or MatchError(pos, self.rule), tokens)
                 matches.append(match)
                 pos = match.end
-        except MatchError as e:
-            raise GrammarParseError(self, matches, e, tokens)
+        finally:
+            MEMO.reset(memo)
         lineNumbers = []
         if self.flags & Flags.FLATTEN:
+            # resolve each identity to a single action up front, in order of priority
+            KEEP, MERGE, HOIST, DISCARD, CONDITIONAL = Flatten.KEEP, Flatten.MERGE, Flatten.HOIST, Flatten.DISCARD, Flatten.CONDITIONAL
+            actions = dict.fromkeys(self.conditional, CONDITIONAL)
+            actions.update(dict.fromkeys(self.discard, DISCARD))
+            actions.update(dict.fromkeys(self.hoist, HOIST))
+            actions[None] = HOIST
+            actions.update(dict.fromkeys(self.merge, MERGE))
+            merged = self.merged
             flattened = []
+            # number each line as it is flattened, counting newlines on from the previous line
+            row, last = 1, 0
             for match in matches:
-                flat = do_flatten(match)
-                if isinstance(flat, list):
-                    flattened.extend(flat)
-                else:
-                    flattened.append(flat)
+                lines = []
+                flat = do_flatten(match, lines)
+                if flat is not None:
+                    lines.append(flat)
+                for line in lines:
+                    start = line.start
+                    if start < last: # out of order, recount from the top
+                        row, last = 1, 0
+                    row += tokens.count('\n', last, start)
+                    last = start
+                    flattened.append(line)
+                    lineNumbers.append(row)
             matches = flattened
-            for line in matches:
-                line, _ = getLineInfo(tokens, line.start)
-                lineNumbers.append(line)
         return AST(lineNumbers, matches, tokens)
 
     def __repr__(self):
@@ -703,16 +950,37 @@ PEG = Grammar(Flags.IGNORE_SPACE_AND_TAB | Flags.FLATTEN).register(
     ).resolve()
 PEG.discard.add("Newline")
 
-def make_grammar_from_file(file_path: str, flags: int = Flags.NONE) -> Grammar:
+CACHE_VERSION = 2 # part of the cache key, bump it whenever the pickled Rule or Grammar state changes
+
+def make_grammar_from_file(file_path: str, flags: int = Flags.NONE, cache: bool = False) -> Grammar:
     """
     Load a grammar from a file.
 
     This function reads the grammar definition from the specified file and returns a Grammar object.
     It raises GrammarError if the grammar is invalid or cannot be resolved.
+    If cache is set, the compiled grammar is pickled to a `.cache` file beside the source and reused
+    as long as the source text, flags and CACHE_VERSION are unchanged.
     """
     with open(file_path, 'r') as f:
         text = f.read()
-    return make_grammar(text, flags)
+    if not cache:
+        return make_grammar(text, flags)
+    key = hashlib.blake2b(f"{CACHE_VERSION}:{flags}:{text}".encode(), digest_size=16).digest()
+    cache_path = file_path + ".cache"
+    try:
+        with open(cache_path, 'rb') as f:
+            if f.read(len(key)) == key:
+                return pickle.load(f)
+    except Exception:
+        pass # missing, stale or corrupt cache, any failure to load it is a miss and it is rebuilt below
+    grammar = make_grammar(text, flags)
+    try:
+        with open(cache_path, 'wb') as f:
+            f.write(key)
+            pickle.dump(grammar, f)
+    except OSError:
+        pass # read-only location, the grammar is still usable
+    return grammar
 
 def make_grammar(text: str, flags: int = Flags.NONE) -> Grammar:
     """
@@ -724,40 +992,10 @@ def make_grammar(text: str, flags: int = Flags.NONE) -> Grammar:
     # Grammar,Rule,Identifier,Prefix,Choice,Newline,Sequence,String,Expression,Quantifier,RegEx
     def visit(node: Match, tokens: str) -> Any:
         """Visit a node in the AST and return its value."""
-        if node.rule.identity == "Grammar":
-            return visit_grammar(node, tokens)
-        elif node.rule.identity == "Rule":
-            return visit_rule(node, tokens)
-        elif node.rule.identity == "Priority":
-            return node.slice(tokens)
-        elif node.rule.identity == "Strict":
-            return visit_identifier(node.children[0], tokens)
-        elif node.rule.identity == "Comment":
-            return visit_comment(node, tokens)
-        elif node.rule.identity == "Choice":
-            return visit_choice(node, tokens)
-        elif node.rule.identity == "Sequence":
-            return visit_sequence(node, tokens)
-        elif node.rule.identity == "Prefix":
-            return visit_prefix(node, tokens)
-        elif node.rule.identity == "Suffix":
-            return visit_suffix(node, tokens)
-        elif node.rule.identity == "Quantifier":
-            return visit_quantifier(node, tokens)
-        elif node.rule.identity == "Primary":
-            return visit_primary(node, tokens)
-        elif node.rule.identity == "Group":
-            return visit_group(node, tokens)
-        elif node.rule.identity == "Predicate":
-            return visit_predicate(node, tokens)
-        elif node.rule.identity == "Identifier":
-            return visit_identifier(node, tokens)
-        elif node.rule.identity == "String":
-            return visit_string(node, tokens)
-        elif node.rule.identity == "RegEx":
-            return visit_regex(node, tokens)
-        else:
+        visitor = visitors.get(node.rule.identity)
+        if visitor is None:
             raise GrammarError(f"Unknown rule identifier {node.rule.identity!r}")
+        return visitor(node, tokens)
 
     def visit_grammar(node: Match, tokens: str) -> Dict[str, Rule | str]:
         grammar = {}
@@ -768,6 +1006,12 @@ def make_grammar(text: str, flags: int = Flags.NONE) -> Grammar:
             grammar[identifier] = rule
         return grammar
 
+    def visit_priority(node: Match, tokens: str) -> str:
+        return node.slice(tokens)
+
+    def visit_strict(node: Match, tokens: str) -> str:
+        return visit_identifier(node.children[0], tokens)
+
     def visit_comment(node: Match, tokens: str):
         return RuleString(node.slice(tokens)[2:].strip()) # remove # and whitespace
 
@@ -776,16 +1020,10 @@ def make_grammar(text: str, flags: int = Flags.NONE) -> Grammar:
         strict = False
         if node.children[0].rule.identity == "Strict":
             strict = True
-        identifier = visit(node.children[0], tokens)
-        match visit(node.children[1], tokens):
-            case "--":
-                discard.add(identifier)
-            case "->":
-                hoist.add(identifier)
-            case "<>":
-                merge.add(identifier)
-            case "~>":
-                cond.add(identifier)
+        identifier = sys.intern(visit(node.children[0], tokens))
+        flatten = priorities.get(visit(node.children[1], tokens))
+        if flatten is not None:
+            flatten.add(identifier)
         rule = visit(node.children[2], tokens)
         if isinstance(rule, Rule):
             rule.strict = strict
@@ -797,32 +1035,34 @@ def make_grammar(text: str, flags: int = Flags.NONE) -> Grammar:
         rules = [visit(child, tokens) for child in node.children]
         if len(rules) == 1 and rules[0].identity == None:
             return rules[0]
-        return RuleChoice(*rules)
+        # an alternative that is a lone rule doesn't need a sequence around it, anchoring keeps the spans it gave
+        rules = [rule.rules[0] if isinstance(rule, RuleAll) and len(rule.rules) == 1 else rule for rule in rules]
+        return RuleChoice(*rules, anchored=True)
 
     def visit_sequence(node: Match, tokens: str) -> Rule:
         rules = [visit(child, tokens) for child in node.children]
         return RuleAll(*rules)
 
+    def unwrap(rule: Rule | str) -> Rule | str:
+        """A group of one, like `( Identifier )*`, would only pass its match through, so drop the sequence."""
+        if isinstance(rule, RuleAll) and len(rule.rules) == 1 and rule.identity is None:
+            return rule.rules[0]
+        return rule
+
     def visit_prefix(node: Match, tokens: str) -> Rule:
         identifier = visit(node.children[0], tokens)
         if len(node.children) == 2:
             quantifier = visit(node.children[1], tokens)
-            return quantifier(identifier)
+            return quantifier(unwrap(identifier))
         return identifier
 
     def visit_suffix(node: Match, tokens: str) -> Rule:
         predicate = visit(node.children[0], tokens)
         identifier = visit(node.children[1], tokens)
-        return predicate(identifier)
+        return predicate(unwrap(identifier))
 
     def visit_quantifier(node: Match, tokens: str) -> Type[Rule]:
-        match node.slice(tokens):
-            case "+":
-                return RuleOneOrMore
-            case "*":
-                return RuleZeroOrMore
-            case "?":
-                return RuleOptional
+        return quantifiers.get(node.slice(tokens))
 
     def visit_primary(node: Match, tokens: str) -> Any:
         return visit(node.children[0], tokens)
@@ -831,11 +1071,7 @@ def make_grammar(text: str, flags: int = Flags.NONE) -> Grammar:
         return visit(node.children[0], tokens)
 
     def visit_predicate(node: Match, tokens: str) -> Type[Rule]:
-        match node.slice(tokens):
-            case "&":
-                return RuleAndPredicate
-            case "!":
-                return RuleNotPredicate
+        return predicates.get(node.slice(tokens))
 
     def visit_identifier(node: Match, tokens: str) -> str:
         return node.slice(tokens)
@@ -847,11 +1083,32 @@ def make_grammar(text: str, flags: int = Flags.NONE) -> Grammar:
         pattern = node.slice(tokens)[2:-1] # remove ~
         return RulePattern(re.compile(pattern))
 
+    visitors: Dict[str, Callable[[Match, str], Any]] = {
+        "Grammar": visit_grammar,
+        "Rule": visit_rule,
+        "Priority": visit_priority,
+        "Strict": visit_strict,
+        "Comment": visit_comment,
+        "Choice": visit_choice,
+        "Sequence": visit_sequence,
+        "Prefix": visit_prefix,
+        "Suffix": visit_suffix,
+        "Quantifier": visit_quantifier,
+        "Primary": visit_primary,
+        "Group": visit_group,
+        "Predicate": visit_predicate,
+        "Identifier": visit_identifier,
+        "String": visit_string,
+        "RegEx": visit_regex,
+    }
     discard = set()
     hoist = set()
     merge = set()
     cond = set()
     macros = {}
+    priorities: Dict[str, Set[str]] = {"--": discard, "->": hoist, "<>": merge, "~>": cond}
+    quantifiers: Dict[str, Type[Rule]] = {"+": RuleOneOrMore, "*": RuleZeroOrMore, "?": RuleOptional}
+    predicates: Dict[str, Type[Rule]] = {"&": RuleAndPredicate, "!": RuleNotPredicate}
     try:
         if not text.strip():
             raise GrammarError("Empty grammar definition provided.")
@@ -865,7 +1122,7 @@ def make_grammar(text: str, flags: int = Flags.NONE) -> Grammar:
             grammar.merge = merge
             grammar.conditional = cond
         except KeyError as e:
-            raise GrammarError(f"Missing rule in grammar definition: {e}")
+            raise GrammarError(f"Missing rule in grammar definition: {e}") from e
         return grammar
     except GrammarError as e:
         raise GrammarError(f"Failed to parse grammar: {e}") from e
@@ -884,6 +1141,10 @@ def compare_grammars(g1: Grammar, g2: Grammar, verbose: bool = False) -> bool:
         if verbose:
             print(f"Drilling into {a} and {b}")
         # returns whether or not two rules are equal
+        pair = (id(a), id(b))
+        if pair in compared: # resolved grammars are cyclic, a pair already being compared is assumed equal
+            return True
+        compared.add(pair)
         if type(a) != type(b):
             if verbose:
                 print(f"Rule {a} is of type {type(a)}, but {b} is of type {type(b)}.")
@@ -897,12 +1158,15 @@ def compare_grammars(g1: Grammar, g2: Grammar, verbose: bool = False) -> bool:
                 if verbose:
                     print(f"Rule {a} has {len(a.rules)} children, but {b} has {len(b.rules)} children.")
                 raise CompareError(a, b)
-            for i, child in enumerate(a.rules):
-                return drill(child, b.rules[i]) 
+            # stop at the first child that differs, later children aren't drilled
+            for child, other in zip(a.rules, b.rules):
+                if not drill(child, other):
+                    return False
             return True
         if isinstance(a, RuleReference):
             return a.identity == b.identity
         return False # no idea what the hell this is, so return False
+    compared: Set[Tuple[int, int]] = set()
     try:
         for identifier, rule in g1.rules.items():
             if identifier not in g2.rules:
@@ -914,6 +1178,7 @@ def compare_grammars(g1: Grammar, g2: Grammar, verbose: bool = False) -> bool:
             if not drill(rule, g2.rules[identifier]):
                 raise CompareError(rule, g2.rules[identifier])
     except CompareError as e:
-        print(f"Grammar comparison failed: {e}")
+        if verbose:
+            print(f"Grammar comparison failed: {e}")
         return False
     return True
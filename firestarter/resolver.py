@@ -1,9 +1,40 @@
+from typing import Callable, Dict
 from . import Symbol
 
 class Resolver:
-    """A generic resolver for symbols in the Firestarter language."""
+    """
+    A generic resolver for symbols in the Firestarter language.
+
+    Handlers are registered per Symbol class and looked up by the node's type in a
+    plain dict. Subclasses of a registered class use the closest registered base,
+    which is cached by type after the first lookup; unhandled nodes are returned as-is.
+    """
     def __init__(self):
-        pass
-        
+        self.handlers: Dict[type, Callable[[Symbol], Symbol]] = {}
+        self.dispatch: Dict[type, Callable[[Symbol], Symbol]] = {}
+
+    def register(self, kind: type, handler: Callable[[Symbol], Symbol]):
+        """Register a handler for nodes of the given Symbol class."""
+        self.handlers[kind] = handler
+        self.dispatch.clear()
+        return self
+
+    def handler(self, kind: type) -> Callable[[Symbol], Symbol]:
+        """Returns the handler for the closest registered class in kind's MRO."""
+        for base in kind.__mro__:
+            handler = self.handlers.get(base)
+            if handler is not None:
+                break
+        else:
+            handler = self.default
+        self.dispatch[kind] = handler
+        return handler
+
+    def default(self, node: Symbol) -> Symbol:
+        return node
+
     def resolve(self, node: Symbol):
-        return node
\ No newline at end of file
+        handler = self.dispatch.get(type(node))
+        if handler is None:
+            handler = self.handler(type(node))
+        return handler(node)
@@ -1,111 +1,194 @@
 from firestarter import Firestarter, SymbolReplace, Symbol as AbstractSymbol, Value as AbstractValue
 from firestarter.grammar import make_grammar_from_file, Grammar, Flags as GrammarFlags, GrammarError
 from firestarter.resolver import Resolver as AbstractResolver
-from functools import singledispatchmethod
+from typing import Any
+import functools
+import operator
+import sys
 
 class Symbol(AbstractSymbol):
-    pass
+    __slots__ = ()
+    token: str = ""
+    def __init__(self):
+        pass
+    def __repr__(self):
+        return self.token or super().__repr__()
 
 class Bang(Symbol):
-    pass
+    __slots__ = ()
+    token = "!"
 
 class Plus(Symbol):
-    pass
+    __slots__ = ()
+    token = "+"
+    precedence = 5
 
 class Minus(Symbol):
-    pass
+    __slots__ = ()
+    token = "-"
+    precedence = 5
 
 class Mul(Symbol):
-    pass
+    __slots__ = ()
+    token = "*"
+    precedence = 6
 
 class Div(Symbol):
-    pass
+    __slots__ = ()
+    token = "/"
+    precedence = 6
 
 class Gt(Symbol):
-    pass
+    __slots__ = ()
+    token = ">"
+    precedence = 4
 
 class Lt(Symbol):
-    pass
+    __slots__ = ()
+    token = "<"
+    precedence = 4
 
 class Ge(Symbol):
-    pass
+    __slots__ = ()
+    token = ">="
+    precedence = 4
 
 class Le(Symbol):
-    pass
+    __slots__ = ()
+    token = "<="
+    precedence = 4
 
 class Eq(Symbol):
-    pass
+    __slots__ = ()
+    token = "=="
+    precedence = 3
 
 class Ne(Symbol):
-    pass
+    __slots__ = ()
+    token = "!="
+    precedence = 3
 
 class Op(Symbol):
-    pass
+    __slots__ = ()
+    token = "?"
 
 class And(Symbol):
-    pass
+    __slots__ = ()
+    token = "and"
+    precedence = 2
 
 class Or(Symbol):
-    pass
+    __slots__ = ()
+    token = "or"
+    precedence = 1
+
+INVERSE = {Eq: Ne, Ne: Eq, Lt: Ge, Ge: Lt, Gt: Le, Le: Gt}
+
+FOLD = {
+    Plus: operator.add, Minus: operator.sub, Mul: operator.mul, Div: operator.truediv,
+    Gt: operator.gt, Lt: operator.lt, Ge: operator.ge, Le: operator.le,
+    Eq: operator.eq, Ne: operator.ne,
+}
 
 class Primitive(AbstractValue):
-    pass
+    __slots__ = ()
 
 class Operation(AbstractSymbol):
-    pass
+    __slots__ = ()
 
 class AbstractObject(AbstractSymbol):
-    pass
+    __slots__ = ()
 
 class Null(Primitive):
+    __slots__ = ()
+    type = type(None)
     def __init__(self):
-        super().__init__(None)
+        self.value = None
     def __repr__(self):
         return "Null"
     
 class Boolean(Primitive):
+    __slots__ = ()
+    type = bool
     def __init__(self, value: str):
         super().__init__(True if value == "True" else False)
     def __repr__(self):
         return "True" if self.value else "False"
     
 class Number(Primitive):
+    __slots__ = ()
+    type = float
     def __init__(self, value: str):
         try:
-            value = float(value)
+            super().__init__(value)
         except ValueError:
             raise ValueError(f"Invalid number: {value}")
-        if value % 1 == 0:
-            value = int(value)
-        super().__init__(value)
+        if self.value % 1 == 0:
+            self.value = int(self.value)
     def __repr__(self):
         return str(self.value)
     
 class String(Primitive):
+    __slots__ = ()
+    type = str
     def __init__(self, value: str):
-        if not value.startswith('"') or not value.endswith('"'):
+        # the grammar quotes strings with either " or ', matched at both ends
+        if len(value) < 2 or value[0] not in "\"'" or value[-1] != value[0]:
             raise ValueError(f"Invalid string: {value}")
-        value = value[1:-1]  # Remove quotes
-        super().__init__(value)
+        self.value = value[1:-1] # already text, skip converting it through type
     def __repr__(self):
         return f'"{self.value}"'
     
 class Identifier(Primitive):
+    __slots__ = ("name",)
+    type = str
     def __init__(self, name: str):
-        self.name = name
+        # the grammar hands derived names over as the Identifier they were parsed as
+        self.name = sys.intern(name if isinstance(name, str) else name.name) # names are looked up over and over, share one object per name
+        self.value = self.name # Value compares by value, an identifier is equal to another of the same name
     def __repr__(self):
         return f"<Identifier: {self.name}>"
 
+def literal(value: Any) -> Primitive:
+    """Wrap a value computed at compile time in the matching Primitive."""
+    if value is None:
+        return Null()
+    if isinstance(value, bool):
+        kind = Boolean
+    elif isinstance(value, (int, float)):
+        kind = Number
+        if value % 1 == 0:
+            value = int(value)
+    else:
+        kind = String
+    # the value is already native, so skip rendering it to source text for __init__ to parse back
+    symbol = kind.__new__(kind)
+    symbol.value = value
+    return symbol
+
+def isLiteral(symbol: AbstractSymbol) -> bool:
+    """Whether the symbol's value is already known at compile time."""
+    return isinstance(symbol, Primitive) and not isinstance(symbol, Identifier)
+
+def construct(op: type, *args: Any) -> AbstractSymbol:
+    """Build a symbol, returning its replacement if it folds itself away."""
+    try:
+        return op(*args)
+    except SymbolReplace as e:
+        return e.new
+
 class Variable(Identifier):
-    pass
+    __slots__ = ()
 
 class Import(Identifier):
+    __slots__ = ()
     def __init__(self, name: str):
         super().__init__(name)
     def __repr__(self):
         return f"<Import: {self.name}>"
 
 class Property(Variable):
+    __slots__ = ("values",)
     def __init__(self, name: str, *values: AbstractValue):
         super().__init__(name)
         self.values = list(values)
@@ -113,6 +196,7 @@ class Property(Variable):
         return f"<Property: {self.name}, Values: {self.values}>"
     
 class Action(Variable):
+    __slots__ = ("statements",)
     def __init__(self, name: str, *statements: AbstractSymbol):
         super().__init__(name)
         self.statements = list(statements)
@@ -120,6 +204,7 @@ class Action(Variable):
         return f"<Action: {self.name}, Statements: {self.statements}>"
 
 class Object(AbstractObject):
+    __slots__ = ("identifier", "imported", "properties", "actions")
     def __init__(self, identifier: Identifier, *properties: Property | Action):
         self.identifier = identifier.name
         self.imported = None
@@ -138,7 +223,7 @@ class Object(AbstractObject):
     def __repr__(self):
         return f"<Object: {self.name}, Properties: {self.properties.keys()}, Actions: {self.actions.keys()}>"
 
-class Call(Operation):
+class Call(Operation): # no slots, an `args` slot would shadow Symbol.args
     def __init__(self, name: str, *args: AbstractValue):
         self.name = name
         self.args = list(args)
@@ -146,34 +231,102 @@ class Call(Operation):
         return f"<Call: {self.name}, Args: {self.args}>"
 
 class UnaryOp(Operation):
+    __slots__ = ("operator", "operand")
     def __init__(self, operator: Symbol, operand: AbstractValue):
+        nested = isinstance(operand, UnaryOp) and type(operand.operator) is type(operator)
+        match operator:
+            case Bang():
+                if isLiteral(operand):
+                    raise SymbolReplace(literal(not operand.value))
+                if isinstance(operand, BinaryOp) and type(operand.operator) in INVERSE:
+                    # !(a < b) is a >= b, one comparison instead of a comparison and a negation
+                    inverse = INVERSE[type(operand.operator)]()
+                    raise SymbolReplace(construct(BinaryOp, operand.left, inverse, operand.right))
+                if nested and isinstance(operand.operand, UnaryOp) and isinstance(operand.operand.operator, Bang):
+                    raise SymbolReplace(operand.operand) # !!!x is !x
+            case Minus():
+                if isinstance(operand, Number):
+                    raise SymbolReplace(literal(-operand.value))
+                if nested:
+                    raise SymbolReplace(operand.operand)
         self.operator = operator
         self.operand = operand
     def __repr__(self):
         return f"<UnaryOp: {self.operator}, Operand: {self.operand}>"
 
 class BinaryOp(Operation):
+    __slots__ = ("left", "operator", "right")
     def __init__(self, left: AbstractValue, operator: Symbol, right: AbstractValue):
+        if isLiteral(left):
+            # a literal on the left already decides which side and/or evaluates to
+            match operator:
+                case And():
+                    raise SymbolReplace(right if left.value else left)
+                case Or():
+                    raise SymbolReplace(left if left.value else right)
+        if isinstance(left, Number) and isinstance(right, Number):
+            # both sides are known at compile time, so fold them into a single literal
+            fold = FOLD.get(type(operator))
+            if fold is not None and not (isinstance(operator, Div) and right.value == 0):
+                raise SymbolReplace(literal(fold(left.value, right.value)))
+        elif isLiteral(left) and type(left) is type(right) and isinstance(operator, (Eq, Ne)):
+            # equality between two literals of the same kind is known too, `"a" is "b"` or `Nil is Nil`
+            raise SymbolReplace(literal(FOLD[type(operator)](left.value, right.value)))
+        elif isinstance(left, String) and isinstance(right, String) and isinstance(operator, (Plus, Gt, Lt, Ge, Le)):
+            # two strings concatenate or compare the same way every time, `"a" + "b"` is `"ab"`
+            raise SymbolReplace(literal(FOLD[type(operator)](left.value, right.value)))
         self.left = left
         self.operator = operator
         self.right = right
     def __repr__(self):
         return f"<BinaryOp: {self.left} {self.operator} {self.right}>"
+
+class Binary(Operation):
+    """
+    Groups a flat run of operands and operators into nested BinaryOps.
+
+    Uses precedence climbing over a single index into the terms, so no operator
+    stack is built; `a + b * c` becomes `a + (b * c)`.
+    """
+    __slots__ = ()
+    def __init__(self, *terms: AbstractSymbol):
+        if len(terms) % 2 == 0:
+            raise ValueError(f"Incomplete expression: {terms}")
+
+        def climb(left, i, minimum):
+            while i < len(terms) and terms[i].precedence >= minimum:
+                operator = terms[i]
+                precedence = operator.precedence
+                right = terms[i + 1]
+                i += 2
+                while i < len(terms) and terms[i].precedence > precedence:
+                    right, i = climb(right, i, precedence + 1)
+                left = construct(BinaryOp, left, operator, right)
+            return left, i
+
+        result, _ = climb(terms[0], 1, 0)
+        raise SymbolReplace(result)
     
 class Block(Operation):
+    __slots__ = ("statements",)
     def __init__(self, *statements: AbstractSymbol):
         self.statements = list(statements)
     def __repr__(self):
         return f"<Block: {len(self.statements)} statements>"
 
 class Condition(Operation):
+    __slots__ = ("condition", "block")
     def __init__(self, condition: AbstractSymbol, block: Block):
+        if isLiteral(condition):
+            # the branch is already decided, keep its block or drop the statement entirely
+            raise SymbolReplace(block if condition.value else [])
         self.condition = condition
         self.block = block
     def __repr__(self):
         return f"<Condition: {self.condition}, Block: {self.block}>"
 
 class Argument(Identifier):
+    __slots__ = ("op", "default")
     def __init__(self, name: str, op: Op = None, default: AbstractValue = None):
         super().__init__(name)
         self.op = op
@@ -182,12 +335,14 @@ class Argument(Identifier):
         return f"{self.name}{str(self.op or '')}{' = ' + repr(self.default) if self.default is not None else ''}>"
     
 class Arguments(AbstractObject):
+    __slots__ = ("arguments",)
     def __init__(self, *args: Argument):
         self.arguments = list(args)
     def __repr__(self):
         return f"<Arguments: {', '.join(repr(arg) for arg in self.arguments)}>"
     
 class Function(Operation):
+    __slots__ = ("identifier", "arguments", "block")
     def __init__(self, identifier: Identifier, *args: AbstractSymbol):
         self.identifier = identifier.name
         self.arguments = []
@@ -200,6 +355,7 @@ class Function(Operation):
         return f"<Function: {self.identifier}({', '.join(repr(arg) for arg in self.arguments)}), {self.block}>"
     
 class Synonym(AbstractObject):
+    __slots__ = ("name", "aliases")
     def __init__(self, name: str, *aliases: str):
         self.name = name
         self.aliases = list(aliases)
@@ -207,12 +363,14 @@ class Synonym(AbstractObject):
         return f"<Synonym: {self.name}, Aliases: {self.aliases}>"
     
 class SyntaxObject(AbstractObject):
+    __slots__ = ("flags",)
     def __init__(self, *flags: Identifier):
         self.flags = list(flags)
     def __repr__(self):
         return f"<OBJECT ({', '.join(flag.name for flag in self.flags)})>"
     
 class Syntax(AbstractObject):
+    __slots__ = ("name", "tokens")
     def __init__(self, name: Identifier, *tokens: Identifier | SyntaxObject):
         self.name = name
         self.tokens = list(tokens)
@@ -220,12 +378,14 @@ class Syntax(AbstractObject):
         return f"<Syntax: {self.name}, Tokens: {' '.join(repr(token) for token in self.tokens)}>"
     
 class Flag(AbstractObject):
+    __slots__ = ("name",)
     def __init__(self, name: str):
         self.name = name
     def __repr__(self):
         return f"<Flag: {self.name}>"
     
 class Namespace(AbstractObject):
+    __slots__ = ("name", "symbols")
     def __init__(self, name: str, *symbols: AbstractSymbol):
         self.name = name
         self.symbols = list(symbols)
@@ -238,22 +398,27 @@ class Namespace(AbstractObject):
 class Resolver(AbstractResolver):
     """A resolver for symbols in the Tinder language."""
     def __init__(self):
-        pass
+        super().__init__()
 
-    @singledispatchmethod
-    def resolve(self, node: AbstractSymbol) -> AbstractSymbol:
-        return node
+@functools.cache
+def getGrammar() -> Grammar:
+    """The Tinder grammar, built from tinder.peg on first use rather than on import."""
+    return make_grammar_from_file("tinder.peg", GrammarFlags.IGNORE_WHITESPACE | GrammarFlags.FLATTEN)
 
-TINDER = make_grammar_from_file("tinder.peg", GrammarFlags.IGNORE_WHITESPACE | GrammarFlags.FLATTEN)
+def __getattr__(name: str) -> Any:
+    if name == "TINDER": # kept for existing imports, loads the grammar when first read
+        return getGrammar()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
-with open("base.tinder", "r", encoding="utf-8") as f:
-    raw = f.read()
+if __name__ == "__main__":
+    with open("base.tinder", "r", encoding="utf-8") as f:
+        raw = f.read()
 
-try:
-    ast = TINDER.parse(raw)
-except GrammarError as e:
-    print(e)
-    exit(1)
+    try:
+        ast = getGrammar().parse(raw)
+    except GrammarError as e:
+        print(e)
+        exit(1)
 
-ast.pretty_print()
\ No newline at end of file
+    ast.pretty_print()